@@ -1,5 +1,7 @@
 import sys
 import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import math
@@ -10,34 +12,153 @@ import seaborn as sns
 import yfinance as yf
 import pyomo.environ as pyo
 from pyomo.environ import (
-    ConcreteModel, Set, Var, NonNegativeReals, Binary,
+    ConcreteModel, RangeSet, Param, Var, NonNegativeReals, Binary, Suffix,
     Objective, Constraint, ConstraintList, minimize, SolverFactory, TerminationCondition
 )
 
-def BDM_Project(tickers, start_date, end_date, initial_return_range=(0.005, 0.03), step=0.001, max_assets=5):
+# --- Model builder with binary constraint ---
+def _build_model(assets, cov_np, avg_np, target_return, max_assets):
+    N = len(assets)
+    m = ConcreteModel()
+    # Assets are indexed by position so cov_np/avg_np are read with plain integer indexing
+    m.assets = RangeSet(0, N - 1)
+
+    # Continuous allocation variables
+    m.x = Var(m.assets, domain=NonNegativeReals, bounds=(0, 1))
+
+    # Binary selection variables
+    m.y = Var(m.assets, domain=Binary)
+
+    # Return and covariance data live on the model; only the target return changes between solves
+    m.avg = Param(m.assets, initialize=lambda m, i: avg_np[i])
+    m.cov = Param(m.assets, m.assets, initialize=lambda m, i, j: cov_np[i, j])
+
+    # Objective: minimize portfolio variance (cov is symmetric, so only the upper triangle is emitted)
+    diag = pyo.quicksum(m.cov[i, i] * m.x[i] ** 2 for i in m.assets)
+    off = pyo.quicksum(m.cov[i, j] * m.x[i] * m.x[j] for i in m.assets for j in range(i + 1, N))
+    m.obj = Objective(expr=diag + 2 * off, sense=minimize)
+
+    # Total allocation must equal 1
+    m.total_allocation = Constraint(expr=sum(m.x[i] for i in m.assets) == 1)
+
+    # Target return constraint (mutable RHS so the sweep never touches the model structure)
+    m.target_return_value = Param(mutable=True, initialize=target_return)
+    m.target_return = Constraint(
+        expr=pyo.quicksum(m.avg[i] * m.x[i] for i in m.assets) >= m.target_return_value
+    )
+
+    # Linking constraint: allocation only if binary is active
+    bigM = 1.0
+    m.link_binary = ConstraintList()
+    for i in m.assets:
+        m.link_binary.add(m.x[i] <= bigM * m.y[i])
+
+    # Limit number of assets selected
+    m.max_assets = Constraint(expr=sum(m.y[i] for i in m.assets) <= max_assets)
+
+    # Multipliers carried between solves so IPOPT can warm-start its duals
+    m.dual = Suffix(direction=Suffix.IMPORT_EXPORT)
+    m.ipopt_zL_out = Suffix(direction=Suffix.IMPORT)
+    m.ipopt_zU_out = Suffix(direction=Suffix.IMPORT)
+    m.ipopt_zL_in = Suffix(direction=Suffix.EXPORT)
+    m.ipopt_zU_in = Suffix(direction=Suffix.EXPORT)
+
+    return m
+
+
+# Per-process model for the parallel sweep, built once by _init_worker and reused for every target
+_worker_model = None
+
+
+def _init_worker(assets, cov_np, avg_np, max_assets):
+    global _worker_model
+    _worker_model = _build_model(assets, cov_np, avg_np, 0.0, max_assets)
+
+
+def _solve_target(target_return):
+    # One frontier point on this worker's model; module level so worker processes can unpickle it
+    m = _worker_model
+    try:
+        m.target_return_value.set_value(float(target_return))
+        result = SolverFactory("bonmin").solve(m)
+        if result.solver.termination_condition != TerminationCondition.optimal:
+            return None
+        return np.fromiter((m.x[i].value or 0.0 for i in m.assets), dtype=np.float64, count=len(m.assets))
+    except Exception as e:
+        print(f"Error at return {target_return:.4f}: {e}")
+        return None
+
+
+def BDM_Project(tickers, start_date, end_date, initial_return_range=(0.005, 0.03), step=0.001, max_assets=5, n_jobs=1):
     output_dir = "BDM_Outputs"
     os.makedirs(output_dir, exist_ok=True)
 
-    # --- Data download ---
-    price_data = {}
+    # --- Data download (one batched request, cached per ticker set and date range) ---
+    # yfinance upper-cases symbols, so match on the normalized form and relabel with the caller's names
+    requested = {}
     for t in tickers:
+        requested.setdefault(t.strip().upper(), t)
+    symbols = list(requested)
+
+    def download_prices():
         try:
-            df = yf.download(t, start=start_date, end=end_date, interval="1d", progress=False, auto_adjust=False)
-            if not df.empty and 'Adj Close' in df.columns:
-                price_data[t] = df['Adj Close']
+            raw = yf.download(symbols, start=start_date, end=end_date, interval="1d", progress=False,
+                              auto_adjust=False, group_by="ticker", threads=True)
+        except Exception as e:
+            print(f"Failed download: {e}")
+            raw = pd.DataFrame()
+
+        if raw.empty or not isinstance(raw.columns, pd.MultiIndex) or 'Adj Close' not in raw.columns.get_level_values(1):
+            print("No valid data retrieved.")
+            return None
+
+        prep_data = raw.xs('Adj Close', level=1, axis=1)
+        available = prep_data.columns[prep_data.notna().any()]
+        valid_symbols = [s for s in symbols if s in available]
+        for s in symbols:
+            if s not in available:
+                print(f"Warning: no valid data for {requested[s]}")
+
+        if not valid_symbols:
+            print("No valid data retrieved.")
+            return None
+
+        return prep_data[valid_symbols]
+
+    cache_key = hashlib.sha1(f"{sorted(symbols)}|{start_date}|{end_date}".encode()).hexdigest()
+    cache_path = f"{output_dir}/cache/{cache_key}.parquet"
+    # A range reaching today or later is still filling in, so it is neither read from nor written to the cache
+    use_cache = pd.Timestamp(end_date) < pd.Timestamp.today().normalize()
+    prep_data = None
+    if use_cache and os.path.exists(cache_path):
+        try:
+            prep_data = pd.read_parquet(cache_path)
+            if all(s in prep_data.columns for s in symbols):
+                prep_data = prep_data[symbols]
             else:
-                print(f"Warning: no valid data for {t}")
+                # Only complete downloads are cached; anything else is stale, so fetch again
+                prep_data = None
         except Exception as e:
-            print(f"Failed {t}: {e}")
-
-    if not price_data:
-        print("No valid data retrieved.")
-        return None
-
-    prep_data = pd.concat(price_data.values(), axis=1)
-    prep_data.columns = list(price_data.keys())
-
-    if prep_data.empty or prep_data.isnull().all().all():
+            print(f"Warning: could not read cached prices ({e}); downloading again.")
+            prep_data = None
+
+    if prep_data is None:
+        prep_data = download_prices()
+        if prep_data is None:
+            return None
+        # A partial download (e.g. rate-limited tickers) is not cached so the next run retries it
+        if use_cache and list(prep_data.columns) == symbols:
+            try:
+                os.makedirs(f"{output_dir}/cache", exist_ok=True)
+                prep_data.to_parquet(cache_path)
+            except Exception as e:
+                print(f"Warning: could not cache prices ({e}).")
+
+    prep_data = prep_data.rename(columns=requested)
+
+    # One pass over the raw price array; it is reused for the return computations below
+    prices = prep_data.to_numpy(dtype=np.float64)
+    if prices.size == 0 or not np.isfinite(prices).any():
         print("No valid adjusted close data available. Aborting.")
         return None
 
@@ -50,17 +171,46 @@ def BDM_Project(tickers, start_date, end_date, initial_return_range=(0.005, 0.03
         spy_adj = spy["Adj Close"]
 
     # --- Returns and matrices ---
-    daily_returns = prep_data.pct_change().dropna()
-    log_returns = np.log(prep_data / prep_data.shift(1)).dropna()
-    monthly_returns = prep_data.resample('ME').ffill().pct_change().dropna()  # fixed 'M' -> 'ME'
+    # Simple and log returns from one pass over the price matrix; log(p1/p0) == log1p(r)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret = (prices[1:] - prices[:-1]) / prices[:-1]
+        log_ret = np.log1p(ret)
+    keep = ~np.isnan(ret).any(axis=1)  # same rows dropna() would keep
+    return_index = prep_data.index[1:][keep]
+    daily_returns = pd.DataFrame(ret[keep], index=return_index, columns=prep_data.columns)
+    log_returns = pd.DataFrame(log_ret[keep], index=return_index, columns=prep_data.columns)
+    monthly_returns = prep_data.resample('ME').last().pct_change().dropna()  # fixed 'M' -> 'ME'
     avg_return = monthly_returns.mean()
-    cov_matrix = monthly_returns.cov()
-    cor_matrix = monthly_returns.corr()
+    # Returns are NaN-free after dropna(), so a single BLAS-backed np.cov replaces pandas' pairwise loop
+    sample_cov = np.atleast_2d(np.cov(monthly_returns.to_numpy(), rowvar=False))
+    std = np.sqrt(np.diag(sample_cov))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sample_cor = sample_cov / np.outer(std, std)
+    cov_matrix = pd.DataFrame(sample_cov, index=monthly_returns.columns, columns=monthly_returns.columns)
+    cor_matrix = pd.DataFrame(sample_cor, index=monthly_returns.columns, columns=monthly_returns.columns)
+
+    # Positional NumPy views for the model builder (tickers that failed to download are absent)
+    assets = list(cov_matrix.columns)
+    N = len(assets)
+    avg_np = avg_return.to_numpy()
+
+    # Diagonal load keeps cov strictly positive definite so the solver's factorizations stay
+    # well-conditioned; it is raised until a Cholesky factorization succeeds
+    jitter = 1e-10 * max(np.trace(cov_matrix.to_numpy()) / N, 1e-12)
+    for _ in range(6):
+        cov_np = cov_matrix.to_numpy() + jitter * np.eye(N)
+        try:
+            np.linalg.cholesky(cov_np)
+            break
+        except np.linalg.LinAlgError:
+            jitter *= 100
+    else:
+        print("Warning: covariance matrix is not positive definite; solves may be slow or unstable.")
 
     # Baseline returns
     if spy_adj is not None:
         spy_returns = spy_adj.pct_change().dropna()
-        spy_monthly = spy_adj.resample("ME").ffill().pct_change().dropna()
+        spy_monthly = spy_adj.resample("ME").last().pct_change().dropna()
         spy_cum = (1 + spy_returns).cumprod()
         spy_avg_return = spy_monthly.mean()
         spy_risk = spy_monthly.std()
@@ -102,89 +252,168 @@ def BDM_Project(tickers, start_date, end_date, initial_return_range=(0.005, 0.03
     plt.grid(True); plt.tight_layout()
     plt.savefig(f"{output_dir}/monthly_returns.png"); plt.close()
 
-    # Covariance heatmap
+    # Covariance heatmap (cell labels are unreadable and slow to lay out past ~15 assets)
+    annotate = len(cov_matrix) <= 15
     plt.figure(figsize=(15, 12))
-    sns.heatmap(cov_matrix, annot=True, cmap='coolwarm', fmt=".4f", center=0)
+    sns.heatmap(cov_matrix, annot=annotate, cmap='coolwarm', fmt=".4f", center=0, rasterized=not annotate)
     plt.title('Covariance Matrix of Monthly Returns'); plt.tight_layout()
     plt.savefig(f"{output_dir}/covariance_heatmap.png"); plt.close()
 
     # Correlation heatmap
     plt.figure(figsize=(15, 12))
-    sns.heatmap(cor_matrix, annot=True, cmap='coolwarm', fmt=".4f", center=0)
+    sns.heatmap(cor_matrix, annot=annotate, cmap='coolwarm', fmt=".4f", center=0, rasterized=not annotate)
     plt.title('Correlation Matrix of Monthly Returns'); plt.tight_layout()
     plt.savefig(f"{output_dir}/correlation_heatmap.png"); plt.close()
 
-    # --- Model builder with binary constraint ---
-    def build_model(target_return):
-        m = ConcreteModel()
-        m.assets = Set(initialize=tickers)
-
-        # Continuous allocation variables
-        m.x = Var(m.assets, domain=NonNegativeReals, bounds=(0, 1))
-
-        # Binary selection variables
-        m.y = Var(m.assets, domain=Binary)
-
-        # Objective: minimize portfolio variance
-        def portfolio_variance(m):
-            return sum(m.x[i] * cov_matrix.loc[i, j] * m.x[j] for i in m.assets for j in m.assets)
-        m.obj = Objective(rule=portfolio_variance, sense=minimize)
-
-        # Total allocation must equal 1
-        m.total_allocation = Constraint(expr=sum(m.x[i] for i in m.assets) == 1)
-
-        # Target return constraint
-        m.target_return = Constraint(expr=sum(m.x[i] * avg_return[i] for i in m.assets) >= target_return)
-
-        # Linking constraint: allocation only if binary is active
-        bigM = 1.0
-        m.link_binary = ConstraintList()
-        for i in m.assets:
-            m.link_binary.add(m.x[i] <= bigM * m.y[i])
-
-        # Limit number of assets selected
-        m.max_assets = Constraint(expr=sum(m.y[i] for i in m.assets) <= max_assets)
-
-        return m
-
-    def solve_and_extract(m):
-        SolverFactory("bonmin").solve(m)  # BONMIN for MINLP
-        solution = {i: m.x[i].value or 0.0 for i in m.assets}
-        port_return = sum(solution[i] * avg_return[i] for i in m.assets)
-        port_variance = sum(solution[i] * cov_matrix.loc[i, j] * solution[j] for i in m.assets for j in m.assets)
-        port_risk = float(np.sqrt(port_variance))
+    def portfolio_stats(w):
+        # Two BLAS calls on the weight vector; no per-asset Pyomo or pandas access
+        solution = dict(zip(assets, w.tolist()))
+        port_return = float(w @ avg_np)
+        port_variance = float(w @ cov_np @ w)
+        port_risk = math.sqrt(max(port_variance, 0.0))
         return solution, port_return, port_risk
 
+    def solve_and_extract(m, opt):
+        result = opt.solve(m)  # BONMIN for MINLP
+        if result.solver.termination_condition != TerminationCondition.optimal:
+            return None
+        return np.fromiter((m.x[i].value or 0.0 for i in m.assets), dtype=np.float64, count=N)
+
+    # --- Closed-form frontier of the relaxed problem ---
+    # Without the long-only and cardinality limits the minimum-variance weights for a
+    # target return are w = l1 * inv(cov) 1 + l2 * inv(cov) r. When those weights are
+    # long-only and use at most max_assets names they are optimal for the full model
+    # too, so that target is answered without a solver call.
+    try:
+        z1, z2 = np.linalg.solve(cov_np, np.column_stack([np.ones(N), avg_np])).T
+        a, b, c = z1.sum(), z2.sum(), avg_np @ z2
+        frontier_system = np.array([[a, b], [b, c]])
+        gmv_return = b / a
+        # NaN inputs (e.g. too few month-ends for a covariance) do not make solve() raise
+        if not (np.isfinite(z1).all() and np.isfinite(z2).all() and np.isfinite(frontier_system).all()):
+            frontier_system = None
+    except np.linalg.LinAlgError:
+        frontier_system = None
+
+    def closed_form_weights(target_return):
+        if frontier_system is None:
+            return None
+        if target_return <= gmv_return:
+            # Return constraint is slack: the global minimum-variance portfolio is optimal
+            w = z1 / a
+        else:
+            try:
+                lam1, lam2 = np.linalg.solve(frontier_system, [1.0, target_return])
+            except np.linalg.LinAlgError:
+                return None
+            w = lam1 * z1 + lam2 * z2
+        if not np.isfinite(w).all() or w.min() < -1e-9 or np.count_nonzero(w > 1e-9) > max_assets:
+            return None
+        w = np.clip(w, 0.0, None)
+        return w / w.sum()
+
+    def record_result(target_return, w):
+        solution, port_return, port_risk = portfolio_stats(w)
+        clean_weights = {t: solution.get(t, 0.0) for t in tickers}
+        results.append({
+            "target_return": target_return,
+            "actual_return": port_return,
+            "risk": port_risk,
+            "weights": clean_weights
+        })
+
+        # Stop if everything collapses to a single asset
+        return bool(np.count_nonzero(w >= 0.01) == 1 and abs(w.max() - 1.0) < 0.01)
+
     # --- Frontier loop ---
     min_r, max_r = initial_return_range
-    current_r = min_r
     results = []
-    max_concentration_reached = False
-
-    while not max_concentration_reached and current_r <= max_r + 0.1:
-        m = build_model(target_return=current_r)
-        result = SolverFactory("bonmin").solve(m)
-        if result.solver.termination_condition != TerminationCondition.optimal:
-            print(f"Skipping return target {current_r:.4f} — infeasible.")
-            current_r += step
-            continue
-        try:
-            solution, port_return, port_risk = solve_and_extract(m)
-            clean_weights = {t: solution.get(t, 0.0) for t in tickers}
-            results.append({
-                "target_return": current_r,
-                "actual_return": port_return,
-                "risk": port_risk,
-                "weights": clean_weights
-            })
-
-            # Stop if everything collapses to a single asset
-            nonzero_weights = [w for w in clean_weights.values() if w >= 0.01]
-            if len(nonzero_weights) == 1 and abs(nonzero_weights[0] - 1.0) < 0.01:
-                max_concentration_reached = True
-        except Exception as e:
-            print(f"Error at return {current_r:.4f}: {e}")
-        current_r += step
+    # No long-only portfolio can beat the best single asset, so targets above it are all infeasible
+    sweep_end = min(max_r + 0.1, float(avg_np.max()))
+    # One target grid for both sweep modes; multiplying out avoids accumulated float drift
+    n_targets = int(np.floor((sweep_end - min_r) / step + 1e-9)) + 1 if np.isfinite(sweep_end) else 0
+    targets = min_r + step * np.arange(max(n_targets, 0))
+
+    if n_jobs != 1:
+        # Targets are independent, so the solver calls are spread over worker processes (each
+        # building its model once) and the concentration cut-off is applied afterwards in order
+        workers = os.cpu_count() if n_jobs is None or n_jobs < 1 else n_jobs
+        closed = [closed_form_weights(t) for t in targets]
+        pending = [t for t, w in zip(targets, closed) if w is None]
+        solved = iter([])
+        if pending:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_worker,
+                                     initargs=(assets, cov_np, avg_np, max_assets)) as ex:
+                solved = iter(list(ex.map(_solve_target, pending)))
+
+        for target, w in zip(targets, closed):
+            if w is None:
+                w = next(solved)
+            if w is None:
+                print(f"Skipping return target {target:.4f} — infeasible.")
+                continue
+            try:
+                if record_result(float(target), w):
+                    break
+            except Exception as e:
+                print(f"Error at return {target:.4f}: {e}")
+    else:
+        # Consecutive targets only tighten the return constraint, so the model and
+        # solver are kept alive and each solve starts from the previous optimum.
+        # BONMIN has no APPSI persistent interface, so the NL file is still rewritten
+        # per solve, but only the target_return_value parameter changes between them.
+        m = _build_model(assets, cov_np, avg_np, min_r, max_assets)
+        opt = SolverFactory("bonmin")
+        warm_start = None
+        warm_solves = 0
+        duals_match_start = False
+
+        for current_r in targets.tolist():
+            w_closed = closed_form_weights(current_r)
+            if w_closed is not None:
+                # Seed the model with the analytic optimum so the next solver call warm-starts from it
+                for i, wt in enumerate(w_closed):
+                    m.x[i].value, m.y[i].value = float(wt), float(wt > 0)
+                # The analytic start has no matching duals; drop the ones left by an earlier target
+                m.dual.clear()
+                m.ipopt_zL_in.clear()
+                m.ipopt_zU_in.clear()
+                duals_match_start = False
+                w = w_closed
+            else:
+                m.target_return_value.set_value(current_r)
+                if warm_start is not None:
+                    # Restore the last optimum in case a skipped target left junk values behind
+                    for i in m.assets:
+                        m.x[i].value, m.y[i].value = warm_start[i]
+                    opt.options.update({
+                        # Multipliers are only reused when they came from the solve that produced the start point
+                        "ipopt.warm_start_init_point": "yes" if duals_match_start else "no",
+                        "ipopt.warm_start_bound_push": 1e-20,
+                        "ipopt.warm_start_bound_frac": 1e-20,
+                        "ipopt.warm_start_slack_bound_push": 1e-20,
+                        "ipopt.warm_start_mult_bound_push": 1e-20,
+                        "ipopt.mu_init": max(1e-4 / 10 ** warm_solves, 1e-8),
+                    })
+                    warm_solves += 1
+                w = solve_and_extract(m, opt)
+            if w is None:
+                print(f"Skipping return target {current_r:.4f} — infeasible.")
+                continue
+            try:
+                max_concentration_reached = record_result(current_r, w)
+
+                warm_start = {i: (m.x[i].value, m.y[i].value) for i in m.assets}
+                if w_closed is None:
+                    for i in m.assets:
+                        m.ipopt_zL_in[m.x[i]] = m.ipopt_zL_out.get(m.x[i], 0.0)
+                        m.ipopt_zU_in[m.x[i]] = m.ipopt_zU_out.get(m.x[i], 0.0)
+                    duals_match_start = True
+            except Exception as e:
+                print(f"Error at return {current_r:.4f}: {e}")
+                continue
+            if max_concentration_reached:
+                break
 
     if not results:
         print("No feasible portfolios found.")
@@ -218,13 +447,15 @@ def BDM_Project(tickers, start_date, end_date, initial_return_range=(0.005, 0.03
     plt.savefig(f"{output_dir}/efficient_frontier_with_baseline.png"); plt.close()
 
     # --- Allocation spaghetti plot ---
-    alloc_data = []
-    for r in results:
-        weights = {t: r["weights"].get(t, 0.0) for t in tickers}
-        alloc_data.append(weights)
+    alloc_tickers = list(dict.fromkeys(tickers))  # repeated tickers share one column
+    alloc = np.zeros((len(results), len(alloc_tickers)))
+    risks = np.empty(len(results))
+    for k, r in enumerate(results):
+        risks[k] = r["risk"]
+        for j, t in enumerate(alloc_tickers):
+            alloc[k, j] = r["weights"].get(t, 0.0)
 
-    alloc_df = pd.DataFrame(alloc_data, index=[r["risk"] for r in results])
-    alloc_df = alloc_df.sort_index()
+    alloc_df = pd.DataFrame(alloc, index=risks, columns=alloc_tickers).sort_index()
 
     plt.figure(figsize=(12, 6))
     for col in alloc_df.columns:
@@ -285,6 +516,10 @@ def BDM_Project(tickers, start_date, end_date, initial_return_range=(0.005, 0.03
     frontier_df.to_csv(f"{output_dir}/efficient_frontier.csv", index=False)
     alloc_df.to_csv(f"{output_dir}/allocations.csv")
 
+    # Largest tables also as parquet for fast, typed reloads
+    daily_returns.to_parquet(f"{output_dir}/daily_returns.parquet")
+    alloc_df.to_parquet(f"{output_dir}/allocations.parquet")
+
     # Baseline CSVs
     if spy_returns is not None:
         spy_returns.to_csv(f"{output_dir}/spy_daily_returns.csv")